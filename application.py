@@ -1,48 +1,263 @@
 import os
+import gzip
+import hashlib
+import uuid
+import atexit
+import threading
+import orjson
 import requests
-from robin_stocks import robinhood
-from flask import Flask, request, render_template_string
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from collections import OrderedDict
+from urllib.parse import urlsplit
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FuturesTimeout
+from flask import Flask, Response, request
+from markupsafe import escape
+from werkzeug.wrappers import Response as BaseResponse
 import configparser
+from dataclasses import dataclass
+from types import ModuleType
+from typing import Any, Callable, TypeVar
 
 app = Flask(__name__)
 
+T = TypeVar("T")
+
 # -------------------------------------------------------------------
-# 1. Load config from config.ini
+# 1. Load config (environment / .env first, then config.ini)
 # -------------------------------------------------------------------
+try:
+    from dotenv import load_dotenv
+    load_dotenv()
+except ImportError:
+    pass
+
 config = configparser.ConfigParser()
-config.read("config.ini")  
+config.read("config.ini")
+
+def _get(key: str, default: str = "") -> str:
+    return os.getenv(key) or config.get("default", key, fallback=default) or default
+
+def _get_bool(key: str, default: bool = False) -> bool:
+    return _get(key, str(default)).strip().lower() in ("1", "true", "yes", "on")
+
+@dataclass(frozen=True, slots=True)
+class Cfg:
+    rh_user: str
+    rh_pw: str
+    mfa: str
+    master_url: str
+    token: str
+    symbol: str
+    auto_trade: bool
+    prewarm: bool
+
+# Read once at import and never mutated afterwards
+CFG = Cfg(
+    rh_user=_get("ROBINHOOD_USERNAME"),
+    rh_pw=_get("ROBINHOOD_PASSWORD"),
+    mfa=_get("MFA_CODE"),
+    master_url=_get("MASTER_TRADE_SIGNAL_URL"),
+    token=_get("USER_TOKEN"),
+    symbol=_get("SYMBOL"),
+    auto_trade=_get_bool("AUTO_TRADE"),
+    prewarm=_get_bool("PREWARM", True)
+)
+
+# -------------------------------------------------------------------
+# 1b. Pooled HTTP sessions, one per upstream host
+# -------------------------------------------------------------------
+# Each host gets its own session so repeated /trade clicks reuse the
+# same keep-alive connection instead of reconnecting every time. The
+# map is bounded; the least recently used session is closed on overflow.
+MAX_SESSIONS = 64
+_SESSIONS: "OrderedDict[str, requests.Session]" = OrderedDict()
+_SESSIONS_LOCK = threading.Lock()
+
+def _new_session() -> requests.Session:
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=16,
+        max_retries=Retry(total=2, backoff_factor=0.2, status_forcelist=[502, 503, 504])
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update({"User-Agent": "TradingSignal/1.0"})
+    return session
+
+def _session_for(url: str) -> requests.Session:
+    """
+    Returns the pooled session for the host:port of url.
+    """
+    host = urlsplit(url).netloc
+    with _SESSIONS_LOCK:
+        session = _SESSIONS.get(host)
+        if session is not None:
+            _SESSIONS.move_to_end(host)
+            return session
+        session = _SESSIONS[host] = _new_session()
+        if len(_SESSIONS) > MAX_SESSIONS:
+            _, evicted = _SESSIONS.popitem(last=False)
+            evicted.close()
+        return session
+
+def _close_sessions() -> None:
+    with _SESSIONS_LOCK:
+        for session in _SESSIONS.values():
+            session.close()
+        _SESSIONS.clear()
+
+atexit.register(_close_sessions)
+
+# -------------------------------------------------------------------
+# 1c. Background executor for trade jobs
+# -------------------------------------------------------------------
+# /trade hands the work off here so the request thread is not held
+# while we talk to the master and to Robinhood. Only the most recent
+# MAX_TRADE_JOBS results are kept around for /trade-status.
+MAX_TRADE_JOBS = 256
+TRADE_EXECUTOR = ThreadPoolExecutor(max_workers=4)
+TRADE_JOBS: "OrderedDict[str, Future[tuple[bool, str]]]" = OrderedDict()
+atexit.register(TRADE_EXECUTOR.shutdown, wait=False)
+
+# Every click asks the master the same question (same token and
+# symbol), so clicks that land while a job is still running share that
+# job instead of issuing another signal request and order. A job whose
+# order call timed out stays in flight until that call really returns,
+# since the order can still go through in the background.
+_INFLIGHT_JOB_ID: str | None = None
+_PENDING_ORDER: Future[Any] | None = None
+_TRADE_LOCK = threading.Lock()
+
+def submit_trade() -> tuple[str, bool]:
+    """
+    Returns (job_id, started): the id of the running trade job, and
+    whether this call started it or joined one already in progress.
+    """
+    global _INFLIGHT_JOB_ID
+    with _TRADE_LOCK:
+        job_id = _INFLIGHT_JOB_ID
+        if job_id is not None:
+            inflight = TRADE_JOBS.get(job_id)
+            if inflight is not None and not inflight.done():
+                return job_id, False
+            if _PENDING_ORDER is not None and not _PENDING_ORDER.done():
+                return job_id, False
+
+        job_id = uuid.uuid4().hex
+        TRADE_JOBS[job_id] = TRADE_EXECUTOR.submit(do_trade_logic)
+        _INFLIGHT_JOB_ID = job_id
+        while len(TRADE_JOBS) > MAX_TRADE_JOBS:
+            TRADE_JOBS.popitem(last=False)
+        return job_id, True
+
+# -------------------------------------------------------------------
+# 1d. Deadlines for outbound calls
+# -------------------------------------------------------------------
+# (connect, read) timeout for the master endpoint
+MASTER_TIMEOUT = (3.05, 10)
+
+# robin_stocks does not let us pass a timeout per call, so its calls
+# run on their own pool and we stop waiting after ROBINHOOD_TIMEOUT.
+ROBINHOOD_TIMEOUT = 15
+ROBINHOOD_EXECUTOR = ThreadPoolExecutor(max_workers=4)
+atexit.register(ROBINHOOD_EXECUTOR.shutdown, wait=False)
 
-RH_USERNAME = config.get("default", "ROBINHOOD_USERNAME", fallback="")
-RH_PASSWORD = config.get("default", "ROBINHOOD_PASSWORD", fallback="")
-MFA_CODE = config.get("default", "MFA_CODE", fallback="")
-MASTER_TRADE_SIGNAL_URL = config.get("default", "MASTER_TRADE_SIGNAL_URL", fallback="")
-USER_TOKEN = config.get("default", "USER_TOKEN", fallback="")
-SYMBOL = config.get("default", "SYMBOL", fallback="")
-AUTO_TRADE = config.getboolean("default", "AUTO_TRADE", fallback=False)
+def _with_deadline(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """
+    Runs fn on the Robinhood pool, raising FuturesTimeout if it takes
+    longer than ROBINHOOD_TIMEOUT seconds.
+    """
+    return ROBINHOOD_EXECUTOR.submit(fn, *args, **kwargs).result(timeout=ROBINHOOD_TIMEOUT)
 
 # -------------------------------------------------------------------
 # 2. Login to Robinhood (helper)
 # -------------------------------------------------------------------
-def login_to_robinhood():
+# robin_stocks is imported on first use: it is a large package and a
+# worker that only serves pages never needs it.
+_rh: ModuleType | None = None
+
+def _robinhood() -> ModuleType:
+    global _rh
+    if _rh is None:
+        from robin_stocks import robinhood
+        _rh = robinhood
+        return robinhood
+    return _rh
+
+# robin_stocks keeps the issued token in ~/.tokens once we log in with
+# store_session, so after the first login we only need to remember that
+# the SDK session is already authorized.
+_LOGGED_IN = False
+_LOGIN_LOCK = threading.Lock()
+
+def login_to_robinhood() -> None:
     """
-    Logs into Robinhood. If MFA_CODE is present, we pass it.
+    Logs into Robinhood once and reuses the session afterwards.
+    If an MFA code is configured, we pass it.
     """
-    if MFA_CODE:
-        robinhood.login(
-            username=RH_USERNAME,
-            password=RH_PASSWORD,
-            mfa_code=MFA_CODE
-        )
-    else:
-        robinhood.login(
-            username=RH_USERNAME,
-            password=RH_PASSWORD
-        )
+    global _LOGGED_IN
+    if _LOGGED_IN:
+        return
+
+    with _LOGIN_LOCK:
+        if _LOGGED_IN:
+            return
+        if CFG.mfa:
+            _robinhood().login(
+                username=CFG.rh_user,
+                password=CFG.rh_pw,
+                mfa_code=CFG.mfa,
+                store_session=True
+            )
+        else:
+            _robinhood().login(
+                username=CFG.rh_user,
+                password=CFG.rh_pw,
+                store_session=True
+            )
+        _LOGGED_IN = True
+
+def _is_auth_error(result: Any) -> bool:
+    """
+    robin_stocks returns the error body instead of raising on a 401,
+    e.g. {"detail": "Invalid token."}
+    """
+    if not isinstance(result, dict):
+        return False
+    detail = str(result.get("detail", "")).lower()
+    return "token" in detail or "authentication" in detail
+
+def _submit_order(order_fn: Callable[..., Any], **kwargs: Any) -> Any:
+    """
+    Like _with_deadline, but remembers the order future so submit_trade
+    can tell when a timed-out order has actually finished.
+    """
+    global _PENDING_ORDER
+    future = ROBINHOOD_EXECUTOR.submit(order_fn, **kwargs)
+    _PENDING_ORDER = future
+    return future.result(timeout=ROBINHOOD_TIMEOUT)
+
+def place_order(order_fn: Callable[..., Any], **kwargs: Any) -> Any:
+    """
+    Places an order, logging in again once if Robinhood rejects our token.
+    """
+    global _LOGGED_IN
+    result = _submit_order(order_fn, **kwargs)
+    if _is_auth_error(result):
+        _LOGGED_IN = False
+        _with_deadline(login_to_robinhood)
+        result = _submit_order(order_fn, **kwargs)
+    return result
 
 # -------------------------------------------------------------------
 # 3. HTML template
 # -------------------------------------------------------------------
-HTML_TEMPLATE = """
+# The page is plain string pieces joined per request. The user/symbol
+# block only depends on config, so it is built once. Anything
+# interpolated goes through escape().
+HEAD_B = b"""
 <!doctype html>
 <html>
 <head>
@@ -54,10 +269,16 @@ HTML_TEMPLATE = """
 </head>
 <body>
     <h2>Trading Signal Homepage</h2>
+"""
 
-    <p><strong>User Email:</strong> {{ email }}</p>
-    <p><strong>Symbol:</strong> {{ symbol }}</p>
+USER_B = (
+    f"""
+    <p><strong>User Email:</strong> {escape(CFG.rh_user)}</p>
+    <p><strong>Symbol:</strong> {escape(CFG.symbol)}</p>
+"""
+).encode("utf-8")
 
+FORMS_B = b"""
     <form action="/trade" method="POST">
         <button type="submit">Start Trade</button>
     </form>
@@ -65,128 +286,242 @@ HTML_TEMPLATE = """
     <form action="/stop-trade" method="POST">
         <button type="submit">Stop Trade</button>
     </form>
+"""
 
-    {% if message_success %}
-    <p class="message-success">{{ message_success }}</p>
-    {% endif %}
-
-    {% if message_error %}
-    <p class="message-error">{{ message_error }}</p>
-    {% endif %}
+TAIL_B = b"""
 </body>
 </html>
 """
 
+STATUS_FMT = '\n    <p><a href="{}">Check trade status</a></p>\n'.format
+SUCC_FMT = '\n    <p class="message-success">{}</p>\n'.format
+ERR_FMT = '\n    <p class="message-error">{}</p>\n'.format
+
+def _render(msg_s: str | None = None, msg_e: str | None = None, status_url: str | None = None) -> bytes:
+    return b"".join([
+        HEAD_B,
+        USER_B,
+        FORMS_B,
+        STATUS_FMT(escape(status_url)).encode("utf-8") if status_url else b"",
+        SUCC_FMT(escape(msg_s)).encode("utf-8") if msg_s else b"",
+        ERR_FMT(escape(msg_e)).encode("utf-8") if msg_e else b"",
+        TAIL_B
+    ])
+
+# The home and unsubscribe pages only depend on config, so render
+# them once at startup and serve the bytes directly.
+HOME_HTML = _render()
+STOP_HTML = _render(msg_e="Unsubscribed from trading strategy")
+HOME_ETAG = hashlib.md5(HOME_HTML).hexdigest()
+
+# Compressed once here, so serving them gzipped costs nothing per request
+HOME_GZ = gzip.compress(HOME_HTML, 6, mtime=0)
+STOP_GZ = gzip.compress(STOP_HTML, 6, mtime=0)
+
+def _accepts_gzip() -> bool:
+    """
+    True unless the client lists gzip (or only "*") with q=0. An explicit
+    gzip entry wins over the wildcard.
+    """
+    accept = request.accept_encodings
+    for value, quality in accept:
+        if value.lower() == "gzip":
+            return quality > 0
+    return accept["*"] > 0
+
+def _precompressed(body: bytes, body_gz: bytes, headers: dict[str, str] | None = None) -> Response:
+    """
+    Returns the gzipped body when the client accepts it, else the plain one.
+    """
+    resp = Response(mimetype="text/html", headers=headers)
+    resp.vary.add("Accept-Encoding")
+    if _accepts_gzip():
+        resp.set_data(body_gz)
+        resp.headers["Content-Encoding"] = "gzip"
+    else:
+        resp.set_data(body)
+    return resp
+
 # -------------------------------------------------------------------
 # 4. Core trade logic
 # -------------------------------------------------------------------
-def do_trade_logic():
+MSG_SUBSCRIBED = "Subscribed successfully to trading strategy"
+MSG_MASTER_TIMEOUT = "Master timed out"
+MSG_MASTER_ERROR = "Error calling master: {}"
+MSG_MASTER_STATUS = "Master returned error: {}"
+MSG_MASTER_BAD_JSON = "Master returned an invalid signal"
+MSG_NO_ACTION = "No valid action in signal: {}"
+MSG_LOGIN_TIMEOUT = "Robinhood login timed out"
+MSG_LOGIN_FAILED = "Robinhood login failed: {}"
+MSG_ORDER_TIMEOUT = "Order placement timed out and may still be pending, check Robinhood before retrying"
+MSG_ORDER_FAILED = "Order placement failed: {}"
+MSG_TRADE_FAILED = "Trade failed: {}"
+
+def do_trade_logic() -> tuple[bool, str]:
     """
-    1. Log in to Robinhood
-    2. POST to master /trade-signal
-    3. Parse the response, place limit order if BUY/SELL
+    1. POST to master /trade-signal
+    2. Stop early unless the signal is BUY/SELL
+    3. Log in to Robinhood and place the limit order
     Returns (success_boolean, message_string)
     """
-    # 1. Log in
+    # 1. Call the master endpoint
+    payload = {"token": CFG.token, "symbol": CFG.symbol}
     try:
-        login_to_robinhood()
-    except Exception as e:
-        return False, f"Robinhood login failed: {str(e)}"
-
-    # 2. Call the master endpoint
-    payload = {"token": USER_TOKEN, "symbol": SYMBOL}
-    try:
-        resp = requests.post(MASTER_TRADE_SIGNAL_URL, json=payload)
-    except Exception as e:
-        return False, f"Error calling master: {str(e)}"
+        resp = _session_for(CFG.master_url).post(
+            CFG.master_url,
+            data=orjson.dumps(payload),
+            headers={"Content-Type": "application/json"},
+            timeout=MASTER_TIMEOUT
+        )
+    except requests.Timeout:
+        return False, MSG_MASTER_TIMEOUT
+    except requests.RequestException as e:
+        return False, MSG_MASTER_ERROR.format(e)
 
     if resp.status_code != 200:
-        return False, f"Master returned error: {resp.text}"
+        return False, MSG_MASTER_STATUS.format(resp.text)
+
+    try:
+        signal = orjson.loads(resp.content)  # e.g. {"action":"BUY","symbol":"ZSC","quantity":1,"limitPrice":50.0}
+    except orjson.JSONDecodeError:
+        return False, MSG_MASTER_BAD_JSON
+    if not isinstance(signal, dict):
+        return False, MSG_MASTER_BAD_JSON
 
-    signal = resp.json()  # e.g. {"action":"BUY","symbol":"ZSC","quantity":1,"limitPrice":50.0}
     action = signal.get("action")
     limit_price = signal.get("limitPrice")
     quantity = signal.get("quantity", 1)
     symbol = signal.get("symbol")
 
-    # 3. Place the order if recognized
+    # 2. Nothing to trade, so don't bother logging in
+    if action == "BUY":
+        order_fn = _robinhood().order_buy_limit
+    elif action == "SELL":
+        order_fn = _robinhood().order_sell_limit
+    else:
+        return False, MSG_NO_ACTION.format(action)
+
+    # 3. Log in and place the order
     try:
-        if action == "BUY":
-            robinhood.order_buy_limit(
-                symbol=symbol,
-                quantity=quantity,
-                limitPrice=limit_price
-            )
-        elif action == "SELL":
-            robinhood.order_sell_limit(
-                symbol=symbol,
-                quantity=quantity,
-                limitPrice=limit_price
-            )
-        else:
-            return False, f"No valid action in signal: {action}"
+        _with_deadline(login_to_robinhood)
+    except FuturesTimeout:
+        return False, MSG_LOGIN_TIMEOUT
+    except Exception as e:
+        # robin_stocks raises plain Exception for bad credentials/MFA
+        return False, MSG_LOGIN_FAILED.format(e)
 
+    try:
+        place_order(
+            order_fn,
+            symbol=symbol,
+            quantity=quantity,
+            limitPrice=limit_price
+        )
+    except FuturesTimeout:
+        # The order may still go through; don't assume it failed.
+        return False, MSG_ORDER_TIMEOUT
     except Exception as e:
-        return False, f"Order placement failed: {str(e)}"
+        # Last-resort net: robin_stocks has no exception hierarchy of its own
+        return False, MSG_ORDER_FAILED.format(e)
 
-    return True, "Subscribed successfully to trading strategy"
+    return True, MSG_SUBSCRIBED
 
 # -------------------------------------------------------------------
 # 5. Flask routes
 # -------------------------------------------------------------------
 @app.route("/", methods=["GET"])
-def home():
-    return render_template_string(
-        HTML_TEMPLATE,
-        email=RH_USERNAME,
-        symbol=SYMBOL,
-        message_success=None,
-        message_error=None
-    )
+def home() -> BaseResponse:
+    resp = _precompressed(HOME_HTML, HOME_GZ, {"Cache-Control": "public, max-age=300"})
+    # Each encoding is a different representation, so it gets its own tag
+    if resp.content_encoding == "gzip":
+        resp.set_etag(HOME_ETAG + "-gzip")
+    else:
+        resp.set_etag(HOME_ETAG)
+    # Answers 304 with no body when If-None-Match matches
+    return resp.make_conditional(request)
 
 @app.route("/trade", methods=["POST"])
-def trade():
-    success, msg = do_trade_logic()
+def trade() -> bytes:
+    """
+    Queue the trade logic in the background and point the user at
+    the status page instead of waiting on it.
+    """
+    job_id, started = submit_trade()
+    if not started:
+        return _render(msg_e="A trade is already in progress", status_url=f"/trade-status/{job_id}")
+    return _render(msg_s="Trade queued", status_url=f"/trade-status/{job_id}")
+
+@app.route("/trade-status/<job_id>", methods=["GET"])
+def trade_status(job_id: str) -> bytes | tuple[bytes, int]:
+    """
+    Route to show the outcome of a queued trade
+    """
+    future = TRADE_JOBS.get(job_id)
+    if future is None:
+        return _render(msg_e="Unknown trade job"), 404
+
+    if not future.done():
+        return _render(msg_s="Trade is still running", status_url=f"/trade-status/{job_id}")
+
+    try:
+        success, msg = future.result()
+    except Exception as e:
+        success, msg = False, MSG_TRADE_FAILED.format(e)
+
     if success:
-        return render_template_string(
-            HTML_TEMPLATE,
-            email=RH_USERNAME,
-            symbol=SYMBOL,
-            message_success=msg,
-            message_error=None
-        )
+        return _render(msg_s=msg)
     else:
-        return render_template_string(
-            HTML_TEMPLATE,
-            email=RH_USERNAME,
-            symbol=SYMBOL,
-            message_success=None,
-            message_error=msg
-        )
+        return _render(msg_e=msg)
 
 @app.route("/stop-trade", methods=["POST"])
-def stop_trade():
+def stop_trade() -> Response:
     """
     Route to show unsubscribed message
     """
-    return render_template_string(
-        HTML_TEMPLATE,
-        email=RH_USERNAME,
-        symbol=SYMBOL,
-        message_success=None,
-        message_error="Unsubscribed from trading strategy"
-    )
+    return _precompressed(STOP_HTML, STOP_GZ)
+
+# -------------------------------------------------------------------
+# 6. Connection warm-up
+# -------------------------------------------------------------------
+def prewarm() -> None:
+    """
+    Opens the master connection and logs in to Robinhood ahead of the
+    first click, so the handshakes are not paid on the user's request.
+    """
+    if CFG.master_url:
+        try:
+            _session_for(CFG.master_url).head(CFG.master_url, timeout=(3, 5))
+        except requests.RequestException as e:
+            print("Prewarm: master unreachable:", e)
+
+    # robin_stocks prompts on stdin when credentials are missing
+    if CFG.rh_user and CFG.rh_pw:
+        try:
+            _with_deadline(login_to_robinhood)
+        except FuturesTimeout:
+            print("Prewarm:", MSG_LOGIN_TIMEOUT)
+        except Exception as e:
+            print("Prewarm:", MSG_LOGIN_FAILED.format(e))
+
+if CFG.prewarm:
+    TRADE_EXECUTOR.submit(prewarm)
+
+# Started on import so the startup trade also happens under gunicorn,
+# where this module is never run as __main__. Going through submit_trade
+# means early clicks share this job.
+AUTO_TRADE_JOB_ID: str | None = submit_trade()[0] if CFG.auto_trade else None
 
 # -------------------------------------------------------------------
-# 6. Main Entry
+# 7. Main Entry
 # -------------------------------------------------------------------
 if __name__ == "__main__":
-    if AUTO_TRADE:
-        print("AUTO_TRADE is true. Invoking trade logic at startup...")
-        success, msg = do_trade_logic()
+    if AUTO_TRADE_JOB_ID is not None:
+        print("AUTO_TRADE is true. Waiting for the startup trade...")
+        success, msg = TRADE_JOBS[AUTO_TRADE_JOB_ID].result()
         if success:
             print("AUTO_TRADE success:", msg)
         else:
             print("AUTO_TRADE error:", msg)
 
-    app.run(host="0.0.0.0", port=8000, debug=True)
+    # Dev-only fallback; production runs under gunicorn (see Procfile)
+    app.run(host="0.0.0.0", port=8000, debug=False, threaded=True)
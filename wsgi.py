@@ -0,0 +1,9 @@
+# Patch the standard library before application.py builds its HTTP
+# session and executor, so their sockets cooperate with gevent.
+#
+# Run a single gevent worker (see Procfile): queued trade jobs live in
+# process memory, so /trade-status must hit the process that took /trade.
+from gevent import monkey
+monkey.patch_all()
+
+from application import app  # noqa: E402,F401